@@ -10,6 +10,19 @@ ENV_VAR_API_KEY = 'GEMINI_API_KEY'
 OPTIMAL_DESC_LENGTH = 1500
 MAX_DESC_LENGTH = 2000
 MIN_DESC_LENGTH = 200
+TRIM_WORD_BOUNDARY_RATIO = 0.8  # Trim at the last space only if it falls past this fraction of MAX_DESC_LENGTH
 GENERATION_MAX_TOKENS = 500
 GENERATION_TEMPERATURE = 0.7
+GENERATION_MAX_ATTEMPTS = 4  # Attempts per product on transient API errors (rate limit, unavailable, timeout)
+RETRY_BASE_DELAY = 0.5  # Seconds; doubled on each retry, plus random jitter
+RETRY_MAX_DELAY = 8.0  # Seconds; upper bound on the backoff delay
 MAX_FILENAME_LENGTH = 100  # Max length for generated filenames
+MAX_WORKERS = 4  # Products generated concurrently; keep within your API rate limit
+REQUESTS_PER_MINUTE = 60  # Shared cap on API calls (retries included) across workers; 0 disables it. Match your API tier
+
+# --- Response Cache ---
+CACHE_ENABLED = False  # Reuse stored descriptions for identical prompts (sampled output, so off by default); enable per run with --cache
+CACHE_DIR = '~/.cache/amazon_description_generator'  # One JSON file per cached response
+CACHE_VERSION = 'v1'  # Bump to invalidate every cached response (e.g. after changing the prompt format)
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # Entries older than this are regenerated
+CACHE_MAX_ENTRIES = 1000  # Least recently used files are removed beyond this count
@@ -3,6 +3,7 @@
 import os
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import config # For default values and constants
 import utils # For utility functions like sanitize_filename
@@ -13,6 +14,33 @@ from product_description_generator import AmazonProductDescriptionGenerator
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+def process_product(generator: AmazonProductDescriptionGenerator, index: int, product_text: str, output_dir: str):
+    """
+    Generates and saves the description for one product block. Runs on a worker thread.
+    """
+    product_text_stripped = product_text.strip()
+    if not product_text_stripped:  # Skip empty product blocks
+        logging.warning(f"Skipping empty product block at index {index + 1}.")
+        return
+
+    # Preprocess once; the details are reused for the filename, logging and generation.
+    preliminary_details = generator.preprocess_input(product_text_stripped)
+    product_name = preliminary_details.get('name', f'Product_{index + 1}') # Fallback name
+    output_filename = os.path.join(output_dir, f"{utils.sanitize_filename(product_name, fallback_prefix=f'product_{index + 1}')}.txt")
+
+    logging.info(f"Processing product: '{product_name}' (index {index + 1})...")
+    description = generator.process_product_text(product_text_stripped, preliminary_details)
+
+    if description:
+        try:
+            with open(output_filename, 'w', encoding='utf-8') as outfile:
+                outfile.write(description)
+            logging.info(f"Description saved to: '{output_filename}'")
+        except IOError as e:
+            logging.error(f"Error writing to output file '{output_filename}': {e}")
+    else:
+        logging.error(f"Failed to generate description for product: '{product_name}'.")
+
 def main():
     """
     Main function to process the multi-product input file and generate descriptions.
@@ -38,11 +66,20 @@ def main():
         default=config.DEFAULT_MODEL,
         help=f"Name of the Gemini model to use. Default: {config.DEFAULT_MODEL}"
     )
+    parser.add_argument(
+        "--workers", type=int, default=config.MAX_WORKERS,
+        help=f"Number of products to generate concurrently. Default: {config.MAX_WORKERS}"
+    )
+    parser.add_argument(
+        "--cache", action='store_true',
+        help=f"Reuse descriptions cached in {config.CACHE_DIR} for identical products instead of generating new ones."
+    )
     parser.add_argument(
         "--debug", action='store_true', help="Enable debug logging."
     )
 
     args = parser.parse_args()
+    workers = max(1, args.workers)
 
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG) # Set root logger to DEBUG
@@ -52,11 +89,13 @@ def main():
 
 
     try:
-        generator = AmazonProductDescriptionGenerator(api_key=args.api_key, model_name=args.model)
+        generator = AmazonProductDescriptionGenerator(api_key=args.api_key, model_name=args.model,
+                                                      use_cache=config.CACHE_ENABLED or args.cache,
+                                                      max_workers=workers)
     except ValueError as e:
         logging.error(f"Initialization error: {e}")
         exit(1)
-    except Exception as e: # Catch other potential init errors from genai
+    except Exception as e: # Catch any other initialization error
         logging.error(f"Failed to initialize AmazonProductDescriptionGenerator: {e}", exc_info=True)
         exit(1)
 
@@ -76,33 +115,12 @@ def main():
 
     os.makedirs(args.output_dir, exist_ok=True)  # Create output directory if needed
 
-    for index, product_text in enumerate(product_texts):
-        product_text_stripped = product_text.strip()
-        if not product_text_stripped:  # Skip empty product blocks
-            logging.warning(f"Skipping empty product block at index {index + 1}.")
-            continue
-
-        # Preprocess once to get details for filename and logging
-        # The process_product_text method will call preprocess_input again,
-        # which is slightly redundant but keeps process_product_text self-contained.
-        # Alternatively, pass preprocessed_details to process_product_text.
-        # For this refactor, keeping it simple and closer to original flow.
-        preliminary_details = generator.preprocess_input(product_text_stripped)
-        product_name = preliminary_details.get('name', f'Product_{index + 1}') # Fallback name
-        output_filename = os.path.join(args.output_dir, f"{utils.sanitize_filename(product_name, fallback_prefix=f'product_{index + 1}')}.txt")
-
-        logging.info(f"Processing product: '{product_name}' (index {index + 1})...")
-        description = generator.process_product_text(product_text_stripped)
-
-        if description:
-            try:
-                with open(output_filename, 'w', encoding='utf-8') as outfile:
-                    outfile.write(description)
-                logging.info(f"Description saved to: '{output_filename}'")
-            except IOError as e:
-                logging.error(f"Error writing to output file '{output_filename}': {e}")
-        else:
-            logging.error(f"Failed to generate description for product: '{product_name}'.")
+    # Each product is an independent, network-bound API call, so a small pool overlaps the waits.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(
+            lambda item: process_product(generator, item[0], item[1], args.output_dir),
+            enumerate(product_texts)
+        ))
 
     logging.info("Multi-product description generation process completed.")
 
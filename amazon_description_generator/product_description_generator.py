@@ -2,63 +2,124 @@
 
 import os
 import re
+import time
+import random
 import logging
 from typing import Dict, Optional
 
-import google.generativeai as genai
-from google.api_core import exceptions as google_exceptions
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 import config # Import constants from config.py
+import utils
+
+# Static guidelines, sent once as the model's system instruction rather than inside every prompt.
+_SYSTEM_INSTRUCTION = f"""You write compelling Amazon product descriptions.
+
+Follow these guidelines STRICTLY:
+1.  **Target Audience:** Amazon Shoppers.
+2.  **Goal:** Persuade the customer to buy. Focus on solving problems or fulfilling desires.
+3.  **Length:** Aim for around {config.OPTIMAL_DESC_LENGTH} characters. Do NOT exceed {config.MAX_DESC_LENGTH} characters.
+4.  **Tone:** Enthusiastic, persuasive, customer-focused, trustworthy.
+5.  **Content:**
+    *   Strong hook start.
+    *   Highlight the key features provided in the prompt.
+    *   Emphasize the BENEFITS derived from features (how they help the customer).
+    *   Use bullet points or short paragraphs for readability.
+    *   Incorporate relevant keywords naturally, **avoid stuffing**.
+    *   Include a call to action.
+6.  **Formatting:** Use basic HTML like <p>, <b>, <ul>, <li> sparingly and correctly. Avoid complex elements
+7.  **DO NOT** include the words "Features:" or "Benefits:" literally unless natural.
+"""
+
+# Per-product prompt. Only these slots are filled per call.
+_PROMPT_TEMPLATE = """Create a compelling Amazon product description for: '{name}'.
+
+**Product Information:**
+*   **Name:** {name}
+*   **Key Features:** {features}
+*   **Key Benefits:** {benefits}
+
+Generate the description now:
+"""
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# Name, then optional Features and Benefits sections, extracted in a single pass.
+_SECTIONS_RE = re.compile(r'^(?P<name>.*?)(?:Features:(?P<features>.*?))?(?:Benefits:(?P<benefits>.*))?$',
+                          re.IGNORECASE | re.DOTALL)
+_LATE_FEATURES_RE = re.compile(r'Features:(.*?)(?:Benefits:|$)', re.IGNORECASE | re.DOTALL)
+_FIRST_LINE_RE = re.compile(r'^(.*?)(\r?\n|$)')
+_LIST_SEPARATOR_RE = re.compile(r',|\n')  # Feature/benefit items are comma- or line-separated
+
+_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+_TIMEOUT = (5, 120)  # (connect, read) seconds
+# HTTP statuses that are usually transient (rate limit, overloaded backend) and worth retrying with backoff.
+_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Parts of the request body that are identical for every product.
+_SYSTEM_INSTRUCTION_CONTENT = {"parts": [{"text": _SYSTEM_INSTRUCTION}]}
+_GENERATION_CONFIG = {
+    "temperature": config.GENERATION_TEMPERATURE,
+    "maxOutputTokens": config.GENERATION_MAX_TOKENS,
+}
 
 class AmazonProductDescriptionGenerator:
     """
     Generates Amazon product descriptions using Google's Gemini AI models.
     Contains methods for processing individual product data.
     """
-    def __init__(self, api_key: Optional[str] = None, model_name: str = config.DEFAULT_MODEL):
+    def __init__(self, api_key: Optional[str] = None, model_name: str = config.DEFAULT_MODEL,
+                 use_cache: bool = config.CACHE_ENABLED, max_workers: int = config.MAX_WORKERS):
         """
         Initialize the generator's connection to the AI model.
+        With use_cache, descriptions are stored on disk and reused for identical prompts.
+        max_workers is the number of threads that will share the generator; the connection pool is sized to match.
         """
         load_dotenv()
+        self.use_cache = use_cache
+        self.rate_limiter = utils.RateLimiter(config.REQUESTS_PER_MINUTE) # Shared by all worker threads
         self.api_key = api_key or os.getenv(config.ENV_VAR_API_KEY)
 
         if not self.api_key:
             logging.error(f"{config.ENV_VAR_API_KEY} not found. Set the environment variable or use --api-key.")
             raise ValueError("Gemini API key is required")
 
-        try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(model_name)
-            self.model_name = model_name
-            logging.info(f"Successfully configured Gemini AI with model: {self.model_name}")
-        except Exception as e:
-            logging.error(f"Failed to configure Gemini AI (Model: {model_name}): {e}", exc_info=True)
-            raise
+        # One pooled session for the whole run, so worker threads reuse TCP+TLS connections to the API.
+        # One connection per worker: a smaller pool would close and reopen connections under load.
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_workers)))
+        self.session.headers.update({'Content-Type': 'application/json', 'x-goog-api-key': self.api_key})
+        self.model_name = model_name
+        self.endpoint_url = f"{_API_BASE_URL}/{model_name}:generateContent"
+        logging.info(f"Configured Gemini API client with model: {self.model_name}")
 
     def _parse_feature_list(self, text: str) -> str:
         """Helper to format features as a bulleted list for the prompt."""
-        items = [item.strip() for item in re.split(r',|\n', text) if item.strip()]
+        items = [stripped for item in _LIST_SEPARATOR_RE.split(text) if (stripped := item.strip())]
         return "\n- ".join([""] + items) if items else "Not specified"
 
     def preprocess_input(self, product_text: str) -> Dict[str, str]:
         """
         Extracts details for a SINGLE product from its text block.
         """
-        cleaned_text = re.sub(r'\s+', ' ', product_text).strip()
+        cleaned_text = _WHITESPACE_RE.sub(' ', product_text).strip()
         logging.debug("Preprocessing input text block...")
 
-        name_match = re.search(r'^(.*?)(?:Features:|Benefits:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
-        name = name_match.group(1).strip() if name_match else ''
+        sections = _SECTIONS_RE.match(cleaned_text)  # Always matches; absent sections are None
+        name = sections['name'].strip()
         if not name and product_text.strip():  # Fallback if regex fails
-            first_line_match = re.match(r'^(.*?)(\r?\n|$)', product_text)  # Use original text
+            first_line_match = _FIRST_LINE_RE.match(product_text)  # Use original text
             name = first_line_match.group(1).strip() if first_line_match else 'Unknown Product'
 
-        features_match = re.search(r'Features:(.*?)(?:Benefits:|$)', cleaned_text, re.IGNORECASE | re.DOTALL)
-        features = features_match.group(1).strip() if features_match else 'Not specified'
-
-        benefits_match = re.search(r'Benefits:(.*?)$', cleaned_text, re.IGNORECASE | re.DOTALL)
-        benefits = benefits_match.group(1).strip() if benefits_match else 'Not specified'
+        features = sections['features']
+        benefits = sections['benefits']
+        if features is None and benefits is not None:
+            # Benefits listed before Features: the features run to the next Benefits or the end of the text.
+            late_features = _LATE_FEATURES_RE.search(benefits)
+            features = late_features.group(1) if late_features else None
+        features = features.strip() if features is not None else 'Not specified'
+        benefits = benefits.strip() if benefits is not None else 'Not specified'
 
         details = {
             'name': name or 'Unknown Product',
@@ -68,6 +129,33 @@ class AmazonProductDescriptionGenerator:
         logging.debug(f"Extracted: Name='{details['name']}', Features='{details['features'][:30]}...', Benefits='{details['benefits'][:30]}...'")
         return details
 
+    def _generate_with_retry(self, prompt: str, product_name: str) -> dict:
+        """
+        Calls the model, retrying connection errors and transient HTTP statuses with exponential backoff and jitter.
+        Returns the decoded response body; raises requests.exceptions.RequestException on final failure.
+        """
+        payload = {
+            "systemInstruction": _SYSTEM_INSTRUCTION_CONTENT,
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": _GENERATION_CONFIG,
+        }
+        for attempt in range(1, config.GENERATION_MAX_ATTEMPTS + 1):
+            self.rate_limiter.wait()
+            try:
+                response = self.session.post(self.endpoint_url, json=payload, timeout=_TIMEOUT)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == config.GENERATION_MAX_ATTEMPTS:
+                    raise
+                reason = type(e).__name__
+            else:
+                if response.status_code not in _RETRY_STATUS_CODES or attempt == config.GENERATION_MAX_ATTEMPTS:
+                    response.raise_for_status()
+                    return response.json()
+                reason = f"HTTP {response.status_code}"
+            delay = min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2 ** (attempt - 1)) + random.uniform(0, config.RETRY_BASE_DELAY)
+            logging.warning(f"Transient API error for '{product_name}' ({reason}). Retrying in {delay:.1f}s (attempt {attempt}/{config.GENERATION_MAX_ATTEMPTS}).")
+            time.sleep(delay)
+
     def generate_description(self, product_details: Dict[str, str]) -> Optional[str]:
         """
         Generates description for a SINGLE product using the Gemini model.
@@ -78,51 +166,45 @@ class AmazonProductDescriptionGenerator:
         formatted_features = self._parse_feature_list(product_details.get('features', ''))
         formatted_benefits = self._parse_feature_list(product_details.get('benefits', ''))
 
-        prompt = f"""Create a compelling Amazon product description for: '{product_name}'.
-
-Follow these guidelines STRICTLY:
-1.  **Target Audience:** Amazon Shoppers.
-2.  **Goal:** Persuade the customer to buy. Focus on solving problems or fulfilling desires.
-3.  **Length:** Aim for around {config.OPTIMAL_DESC_LENGTH} characters. Do NOT exceed {config.MAX_DESC_LENGTH} characters.
-4.  **Tone:** Enthusiastic, persuasive, customer-focused, trustworthy.
-5.  **Content:**
-    *   Strong hook start.
-    *   Highlight key features provided below.
-    *   Emphasize the BENEFITS derived from features (how they help the customer).
-    *   Use bullet points or short paragraphs for readability.
-    *   Incorporate relevant keywords naturally, **avoid stuffing**.
-    *   Include a call to action.
-6.  **Formatting:** Use basic HTML like <p>, <b>, <ul>, <li> sparingly and correctly. Avoid complex elements
-7.  **DO NOT** include the words "Features:" or "Benefits:" literally unless natural.
-
-**Product Information:**
-*   **Name:** {product_name}
-*   **Key Features:** {formatted_features}
-*   **Key Benefits:** {formatted_benefits}
-
-Generate the description now:
-"""
+        prompt = _PROMPT_TEMPLATE.format_map({
+            'name': product_name,
+            'features': formatted_features,
+            'benefits': formatted_benefits,
+        })
+
+        cache_key = None
+        if self.use_cache:
+            cache_key = utils.make_cache_key(self.model_name, _SYSTEM_INSTRUCTION, prompt,
+                                             str(config.GENERATION_TEMPERATURE), str(config.GENERATION_MAX_TOKENS))
+            cached_description = utils.load_cached_response(cache_key)
+            if cached_description is not None:
+                logging.info(f"Cache hit for '{product_name}'; skipping API call.")
+                return cached_description
+            logging.debug(f"Cache miss for '{product_name}'.")
 
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=config.GENERATION_TEMPERATURE,
-                    max_output_tokens=config.GENERATION_MAX_TOKENS
-                )
-            )
-            if response.parts:
-                description = response.text
+            response_data = self._generate_with_retry(prompt, product_name)
+            candidates = response_data.get('candidates') or []
+            parts = candidates[0].get('content', {}).get('parts', []) if candidates else []
+            description = "".join(part.get('text', '') for part in parts)
+            if description:
                 logging.debug(f"Generated description (length={len(description)}).")
+                if cache_key:
+                    utils.store_cached_response(cache_key, description)
                 return description
             else:
-                block_reason = response.prompt_feedback.block_reason if hasattr(response, 'prompt_feedback') and response.prompt_feedback else 'Unknown'
-                safety_ratings = response.prompt_feedback.safety_ratings if hasattr(response, 'prompt_feedback') and response.prompt_feedback else 'N/A'
-                logging.error(f"Generation failed/blocked for '{product_name}'. Reason: {block_reason}. Safety: {safety_ratings}. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'N/A'}")
+                prompt_feedback = response_data.get('promptFeedback', {})
+                block_reason = prompt_feedback.get('blockReason', 'Unknown')
+                safety_ratings = prompt_feedback.get('safetyRatings', 'N/A')
+                finish_reason = candidates[0].get('finishReason', 'N/A') if candidates else 'N/A'
+                logging.error(f"Generation failed/blocked for '{product_name}'. Reason: {block_reason}. Safety: {safety_ratings}. Finish reason: {finish_reason}")
                 return None
 
-        except google_exceptions.GoogleAPIError as e:
-            logging.error(f"Google API error for '{product_name}': {e}", exc_info=True)
+        except requests.exceptions.HTTPError as e:
+            logging.error(f"Gemini API error for '{product_name}': {e}. Response: {e.response.text[:500] if e.response is not None else 'N/A'}")
+            return None
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Gemini API request failed for '{product_name}': {e}")
             return None
         except Exception as e:
             logging.error(f"Unexpected error during generation for '{product_name}': {e}", exc_info=True)
@@ -140,11 +222,12 @@ Generate the description now:
 
         if len(description) > config.MAX_DESC_LENGTH:
             logging.warning(f"Description exceeds max length ({config.MAX_DESC_LENGTH}), trimming.")
-            last_space_index = description.rfind(' ', 0, config.MAX_DESC_LENGTH)
-            if last_space_index != -1:
-                description = description[:last_space_index] + "..."
-            else:
-                description = description[:config.MAX_DESC_LENGTH] + "..."
+            head = description[:config.MAX_DESC_LENGTH]
+            last_space_index = head.rfind(' ')
+            # Only cut back to a word boundary if that keeps most of the text
+            if last_space_index > config.MAX_DESC_LENGTH * config.TRIM_WORD_BOUNDARY_RATIO:
+                head = head[:last_space_index]
+            description = head + "..."
 
         if len(description) < config.MIN_DESC_LENGTH:
             logging.warning(f"Description is shorter than min length ({config.MIN_DESC_LENGTH} chars).")
@@ -152,12 +235,14 @@ Generate the description now:
         logging.debug(f"Validation complete (final length={len(description)}).")
         return description.strip()
 
-    def process_product_text(self, product_text: str) -> Optional[str]:
+    def process_product_text(self, product_text: str, product_details: Optional[Dict[str, str]] = None) -> Optional[str]:
         """
         Processes the text for a single product: preprocess, generate, validate.
+        Pass product_details if preprocess_input was already run on product_text.
         Returns the validated description or None on failure.
         """
-        product_details = self.preprocess_input(product_text)
+        if product_details is None:
+            product_details = self.preprocess_input(product_text)
         if not product_details.get('name') or product_details['name'] == 'Unknown Product':
             logging.warning("Could not parse product name reliably. Using best guess or 'Unknown Product'.")
 
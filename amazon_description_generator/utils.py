@@ -1,19 +1,34 @@
 # utils.py
 
+import hashlib
+import json
+import logging
+import os
 import string
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
 import config
 
+_VALID_FILENAME_CHARS = frozenset("-_.() %s%s" % (string.ascii_letters, string.digits))
+# Deletes every ASCII character that is not valid in a filename. Non-ASCII
+# characters are dropped beforehand by the ASCII encode in sanitize_filename.
+_INVALID_CHARS_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(128) if chr(c) not in _VALID_FILENAME_CHARS))
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(name: str, fallback_prefix: str = "product") -> str:
     """
     Cleans a string to be suitable for use as a filename.
     Replaces spaces, removes invalid characters, and truncates length.
+    Results are memoized, since the function is pure and names often repeat.
     """
     if not name or name.lower() == 'unknown product':
         return fallback_prefix  # Return generic prefix if name is bad
 
     # Remove punctuation and invalid characters
-    valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-    cleaned_name = ''.join(c for c in name if c in valid_chars)
+    cleaned_name = name.encode('ascii', 'ignore').decode('ascii').translate(_INVALID_CHARS_TABLE)
 
     # Replace spaces with underscores
     cleaned_name = cleaned_name.replace(' ', '_')
@@ -28,4 +43,84 @@ def sanitize_filename(name: str, fallback_prefix: str = "product") -> str:
     if not cleaned_name:
         return fallback_prefix
 
-    return cleaned_name
\ No newline at end of file
+    return cleaned_name
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly so that at most calls_per_minute start in any minute, across all threads.
+    Each caller reserves the next free slot under the lock and sleeps outside it.
+    """
+    def __init__(self, calls_per_minute: int):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def _cache_path(key: str) -> str:
+    return os.path.join(os.path.expanduser(config.CACHE_DIR), f"{key}.json")
+
+def make_cache_key(*parts: str) -> str:
+    """
+    Builds a stable cache key from the model name, prompt text and any other inputs that affect the response.
+    CACHE_VERSION is part of the key, so bumping it invalidates every stored entry.
+    """
+    payload = json.dumps([config.CACHE_VERSION, *parts], separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+def load_cached_response(key: str) -> Optional[str]:
+    """
+    Returns the cached response for key, or None if it is missing, expired or unreadable.
+    A hit refreshes the file's access time, which eviction uses as its LRU order.
+    """
+    path = _cache_path(key)
+    try:
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime > config.CACHE_TTL_SECONDS:
+            logging.debug(f"Cache entry expired: {key}")
+            os.remove(path)
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            text = json.load(f)['text']
+        os.utime(path, (time.time(), stat.st_mtime))  # Explicit, so LRU order also works on noatime mounts
+        return text
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable cache entry '{path}': {e}")
+        return None
+
+def store_cached_response(key: str, text: str):
+    """Writes text to the cache atomically, then evicts the least recently used entries beyond CACHE_MAX_ENTRIES."""
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'text': text}, f)
+        os.replace(tmp_path, path)
+        _evict_cache_entries(os.path.dirname(path))
+    except OSError as e:
+        logging.warning(f"Could not write cache entry '{path}': {e}")
+
+def _evict_cache_entries(cache_dir: str):
+    with os.scandir(cache_dir) as entries:
+        files = [entry for entry in entries if entry.name.endswith('.json') and entry.is_file()]
+    excess = len(files) - config.CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return
+    files.sort(key=lambda entry: entry.stat().st_atime)
+    for entry in files[:excess]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # Already removed by a concurrent writer
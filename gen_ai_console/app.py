@@ -1,6 +1,11 @@
 # app.py
 import logging
 import argparse
+import re
+import operator
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Initialize config and logging first
 import config # This also checks for API_KEY
@@ -9,6 +14,112 @@ logger = logging.getLogger(__name__)
 
 import gemini_handler
 import tts_player # Import the new TTS module
+from response_cache import ResponseCache
+
+def speak_response(tts_engine, engine_name: str, text: str):
+    try:
+        logger.debug(f"Attempting to speak response with {engine_name}")
+        tts_engine.speak(text)
+    except Exception as tts_err: # Broad catch for TTS speak errors
+        logger.error(f"TTS speak error with {engine_name}: {tts_err}", exc_info=True)
+        print(f"Warning: TTS failed for this response. Check logs.")
+
+# Splits streamed text after sentence-ending punctuation, so speech can start per sentence.
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+def stream_response(prompt: str, history: deque, cache, tts_engine, engine_name: str, tts_pool) -> str:
+    """
+    Prints the reply as it streams in and queues each completed sentence for speech.
+    Returns the full reply text, or the "Error: ..." string on failure.
+    """
+    print("Gemini: ", end="", flush=True)
+    text_parts = []
+    pending_speech = ""
+    for chunk in gemini_handler.stream_text(
+        api_key=config.API_KEY,
+        model_name=config.MODEL_NAME,
+        prompt=prompt,
+        history=history,
+        cache=cache
+    ):
+        if chunk.startswith("Error:"):
+            print(f"\n{chunk}" if text_parts else chunk)
+            return chunk
+        print(chunk, end="", flush=True)
+        text_parts.append(chunk)
+        if tts_engine:
+            *sentences, pending_speech = _SENTENCE_END_RE.split(pending_speech + chunk)
+            for sentence in sentences:
+                tts_pool.submit(speak_response, tts_engine, engine_name, sentence)
+    print()
+    if tts_engine and pending_speech.strip():
+        tts_pool.submit(speak_response, tts_engine, engine_name, pending_speech)
+    return "".join(text_parts).strip()
+
+# Inputs answered locally, without an API round trip.
+# Operands are capped at 15 digits: longer numbers overflow float division or hit int()'s digit limit,
+# so those inputs go to the model instead.
+_ARITHMETIC_RE = re.compile(r'^\s*(\d{1,15})\s*([+\-*/])\s*(\d{1,15})\s*$')
+_ARITHMETIC_OPS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+# Anchored at both ends so questions that merely start this way ("what is the time complexity...") reach the model.
+_TIME_QUERY_RE = re.compile(r"^\s*what(?:'s| is)?(?: the)? (time|date)(?: is it| today)?\s*\??\s*$", re.IGNORECASE)
+_GREETINGS = frozenset({'hi', 'hello', 'hey'})
+
+def trivial_response(user_input: str) -> str | None:
+    """Returns a canned answer for arithmetic, time/date and greeting inputs, or None if the model is needed."""
+    if match := _ARITHMETIC_RE.match(user_input):
+        left, op, right = match.groups()
+        if op == '/' and int(right) == 0:
+            return "Division by zero is undefined."
+        result = _ARITHMETIC_OPS[op](int(left), int(right))
+        if isinstance(result, float) and result.is_integer():
+            result = int(result)
+        return f"{left} {op} {right} = {result}"
+    if match := _TIME_QUERY_RE.match(user_input):
+        now = datetime.now()
+        if match.group(1).lower() == 'time':
+            return f"It is {now.strftime('%H:%M')}."
+        return f"Today is {now.strftime('%A, %B %d, %Y')}."
+    if user_input.casefold().rstrip('!. ') in _GREETINGS:
+        return "Hello! How can I help you?"
+    return None
+
+def run_batch(path: str, cache):
+    """Handles '/batch <file>': sends each non-empty line of the file as an independent prompt."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    except OSError as e:
+        print(f"Error: Could not read batch file '{path}': {e}")
+        return
+
+    if not prompts:
+        print(f"Batch file '{path}' contains no prompts.")
+        return
+
+    if config.BATCH_COMBINE_PROMPTS:
+        print(f"Sending {len(prompts)} prompts in one request...")
+        send_batch = gemini_handler.generate_combined
+    else:
+        print(f"Sending {len(prompts)} prompts ({config.BATCH_MAX_WORKERS} at a time)...")
+        send_batch = gemini_handler.generate_batch
+    responses = send_batch(
+        api_key=config.API_KEY,
+        model_name=config.MODEL_NAME,
+        prompts=prompts,
+        max_workers=config.BATCH_MAX_WORKERS,
+        cache=cache
+    )
+    for index, (prompt, response_text) in enumerate(zip(prompts, responses), start=1):
+        print(f"\n[{index}] You: {prompt}\nGemini: {response_text}")
+
+def silence_speech(tts_engine, tts_pool):
+    """Drops queued sentences and cuts off the one playing. The pool is shut down; make a new one to speak again."""
+    tts_pool.shutdown(wait=False, cancel_futures=True)
+    if tts_engine:
+        tts_engine.stop() # Also unblocks a speak() stuck writing to the engine
+        tts_pool.shutdown(wait=True) # The sentence already handed to the worker returns promptly now...
+        tts_engine.stop() # ...and whatever it managed to write before stop() is cut off too
 
 def main():
     parser = argparse.ArgumentParser(description="Simple Gemini Chat with TTS")
@@ -24,9 +135,10 @@ def main():
     print(f"Welcome to Simple Gemini Chat! Model: {config.MODEL_NAME}")
     if args.tts != 'none':
         print(f"TTS Engine: {args.tts.capitalize()}")
-    print("Type 'exit' to quit.")
+    print("Type 'exit' to quit, '/stop' to silence speech, or '/batch <file>' to send one prompt per line concurrently.")
 
-    conversation_history = []
+    # One user and one model entry per turn; the deque drops the oldest entries in O(1) once full.
+    conversation_history = deque(maxlen=config.MAX_HISTORY_TURNS * 2)
     active_tts_engine = None
 
     if args.tts != 'none':
@@ -38,6 +150,14 @@ def main():
         elif not active_tts_engine:
              print(f"Warning: Could not initialize TTS engine '{args.tts}'. Continuing without speech.")
 
+    response_cache = None
+    if config.RESPONSE_CACHE_ENABLED:
+        response_cache = ResponseCache(config.RESPONSE_CACHE_PATH,
+                                       ttl_seconds=config.RESPONSE_CACHE_TTL,
+                                       max_entries=config.RESPONSE_CACHE_MAX_ENTRIES)
+        logger.info(f"Response cache enabled at {response_cache.path}")
+
+    tts_pool = ThreadPoolExecutor(max_workers=1)
 
     while True:
         try:
@@ -51,33 +171,49 @@ def main():
             if not user_input:
                 continue
 
+            if user_input.lower() == '/stop':
+                silence_speech(active_tts_engine, tts_pool)
+                tts_pool = ThreadPoolExecutor(max_workers=1)
+                continue
+
+            if user_input.startswith('/batch'):
+                batch_path = user_input[len('/batch'):].strip()
+                if batch_path:
+                    run_batch(batch_path, response_cache)
+                else:
+                    print("Usage: /batch <file>")
+                continue
+
+            if (local_answer := trivial_response(user_input)) is not None:
+                logger.info("Answered input locally without calling the API.")
+                print(f"Gemini: {local_answer}")
+                if active_tts_engine:
+                    tts_pool.submit(speak_response, active_tts_engine, args.tts, local_answer)
+                continue
+
             logger.info(f"User input: {user_input[:50]}...") # Log first 50 chars
-            print("Gemini: Thinking...")
-            response_text = gemini_handler.generate_text(
-                api_key=config.API_KEY,
-                model_name=config.MODEL_NAME,
-                prompt=user_input,
-                history=conversation_history
-            )
-
-            print(f"Gemini: {response_text}")
+            if config.STREAM_RESPONSES:
+                response_text = stream_response(user_input, conversation_history, response_cache,
+                                                active_tts_engine, args.tts, tts_pool)
+            else:
+                print("Gemini: Thinking...")
+                response_text = gemini_handler.generate_text(
+                    api_key=config.API_KEY,
+                    model_name=config.MODEL_NAME,
+                    prompt=user_input,
+                    history=conversation_history,
+                    cache=response_cache
+                )
+                print(f"Gemini: {response_text}")
+                if active_tts_engine and not response_text.startswith("Error:"):
+                    # Speak in the background so the prompt (and the next request) is not
+                    # blocked on audio playback. One worker keeps utterances in order.
+                    tts_pool.submit(speak_response, active_tts_engine, args.tts, response_text)
             logger.info(f"Gemini response: {response_text[:100]}...") # Log first 100 chars
 
             if not response_text.startswith("Error:"):
                 conversation_history.append({"role": "user", "parts": [{"text": user_input}]})
                 conversation_history.append({"role": "model", "parts": [{"text": response_text}]})
-                if len(conversation_history) > 10: # Limit history to last 5 turns
-                    conversation_history = conversation_history[-10:]
-
-                if active_tts_engine:
-                    try:
-                        logger.debug(f"Attempting to speak response with {args.tts}")
-                        active_tts_engine.speak(response_text)
-                    except Exception as tts_err: # Broad catch for TTS speak errors
-                        logger.error(f"TTS speak error with {args.tts}: {tts_err}", exc_info=True)
-                        print(f"Warning: TTS failed for this response. Check logs.")
-                        # Optionally disable TTS for the rest of the session if it keeps failing
-                        # active_tts_engine = None
             else:
                 logger.warning(f"Gemini handler returned an error: {response_text}")
 
@@ -91,5 +227,8 @@ def main():
             print(f"\nAn critical unexpected error occurred: {e}. Exiting.")
             break # Exit on unhandled critical errors in the main loop
 
+    # Leaving shouldn't wait for the rest of the last reply to be read out.
+    silence_speech(active_tts_engine, tts_pool)
+
 if __name__ == "__main__":
     main()
@@ -8,6 +8,14 @@ load_dotenv()
 # --- API Configuration ---
 API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-pro-preview-05-06")
+# Number of past user/model exchanges resent with each request. Bounds prompt size per turn.
+MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "5"))
+# Stream replies as they are generated, so printing and speech start before the full answer arrives.
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+# Concurrent requests used by the /batch command. Keep within your API rate limit.
+BATCH_MAX_WORKERS = max(1, int(os.getenv("BATCH_MAX_WORKERS", "4")))
+# Send a whole /batch as one numbered-question request (falls back to one request per prompt).
+BATCH_COMBINE_PROMPTS = os.getenv("BATCH_COMBINE_PROMPTS", "false").lower() in ("1", "true", "yes")
 
 # --- TTS Configuration ---
 # 'piper', 'espeak', or 'none'
@@ -16,12 +24,21 @@ DEFAULT_TTS_ENGINE = os.getenv("DEFAULT_TTS_ENGINE", "espeak")
 # Piper TTS specific paths (User MUST update PIPER_VOICE_MODEL_PATH if using Piper)
 PIPER_EXECUTABLE_PATH = os.getenv("PIPER_EXECUTABLE_PATH", "piper-tts") # Assumes piper-tts is in PATH
 PIPER_VOICE_MODEL_PATH = os.getenv("PIPER_VOICE_MODEL_PATH", "/home/u/s/tts/en_GB-alan-medium.onnx") # << EXAMPLE PATH
+# Playback buffer requested from PulseAudio by paplay, in ms. Lower starts audio sooner; 0 keeps the server default.
+PAPLAY_LATENCY_MSEC = int(os.getenv("PAPLAY_LATENCY_MSEC", "100"))
 
 # eSpeak-NG specific
 ESPEAK_VOICE = os.getenv("ESPEAK_VOICE", "en-gb")
 ESPEAK_SPEED = int(os.getenv("ESPEAK_SPEED", "180"))
 ESPEAK_PITCH = int(os.getenv("ESPEAK_PITCH", "60"))
 
+# --- Response Cache ---
+# Serve repeated (model, history, prompt) requests from a local cache instead of calling the API.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "~/.cache/gen_ai_console/responses.json")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400")) # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+
 # --- Logging ---
 LOG_LEVEL_STR = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_LEVEL = getattr(logging, LOG_LEVEL_STR, logging.INFO)
@@ -1,20 +1,81 @@
 # gemini_handler.py
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable
+
+from response_cache import ResponseCache
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError: # orjson is optional; the stdlib codec works on the same bytes
+    _json_loads = json.loads
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
 
 logger = logging.getLogger(__name__)
 
-def generate_text(api_key: str, model_name: str, prompt: str, history: list = None) -> str:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
+# One pooled session for the whole chat, so the TCP+TLS connection to the API is reused between turns.
+_SESSION = requests.Session()
+# pool_maxsize bounds the reusable connections per host; beyond it concurrent /batch workers would
+# open throwaway connections (and urllib3 logs "Connection pool is full").
+_POOL_MAXSIZE = 16
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_MAXSIZE))
+_TIMEOUT = (5, 90) # (connect, read) seconds
+
+# Transient failures (rate limiting, overloaded backend) are retried with exponential backoff and jitter.
+_MAX_ATTEMPTS = 4
+_RETRY_BASE_DELAY = 0.5 # seconds
+_RETRY_MAX_DELAY = 8.0 # seconds
+_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+def _post_with_retry(url: str, headers: dict, data: dict, stream: bool = False) -> requests.Response:
+    body = _json_dumps(data) # Serialized once, reused across retries
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        try:
+            response = _SESSION.post(url, headers=headers, data=body, timeout=_TIMEOUT, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+            if attempt == _MAX_ATTEMPTS:
+                raise
+            reason = type(err).__name__ # str(err) repeats the request URL
+        else:
+            if response.status_code not in _RETRY_STATUS_CODES or attempt == _MAX_ATTEMPTS:
+                return response
+            reason = f"status {response.status_code}"
+            response.close()
+        delay = min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2 ** (attempt - 1)) + random.uniform(0, _RETRY_BASE_DELAY)
+        logger.warning(f"Gemini API request failed ({reason}). Retrying in {delay:.1f}s (attempt {attempt}/{_MAX_ATTEMPTS}).")
+        time.sleep(delay)
+
+_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+_REFUSAL_PHRASES = ("i cannot fulfill this request", "i'm unable to create content of that nature", "i am unable to provide assistance")
 
+@lru_cache(maxsize=8)
+def _endpoint_url(model_name: str, method: str) -> str:
+    """Builds the request URL once per (model, method)."""
+    query = "?alt=sse" if method == "streamGenerateContent" else ""
+    return f"{_API_BASE_URL}/{model_name}:{method}{query}"
+
+@lru_cache(maxsize=4)
+def _headers(api_key: str) -> dict:
+    """The key travels in a header so it never shows up in URLs, exception text or logs."""
+    return {'Content-Type': 'application/json', 'x-goog-api-key': api_key}
+
+def _build_payload(prompt: str, history: Iterable[dict] | None) -> dict:
     contents = []
     if history:
         contents.extend(history)
     contents.append({"role": "user", "parts": [{"text": prompt}]})
 
-    data = {
+    return {
         "contents": contents,
         "generationConfig": {
             "temperature": 0.6,
@@ -22,26 +83,58 @@ def generate_text(api_key: str, model_name: str, prompt: str, history: list = No
         }
     }
 
+def _log_refusal(full_text: str):
+    # Simple check for API refusal/inability to answer. The refusal is returned as is, so user sees it.
+    if any(phrase in full_text.lower() for phrase in _REFUSAL_PHRASES):
+        logger.warning(f"Gemini API indicated refusal: {full_text[:100]}...")
+
+def _request_error_message(err: Exception) -> str:
+    """Logs a failed request and returns the matching "Error: ..." string. Call from an except block."""
+    if isinstance(err, requests.exceptions.HTTPError):
+        error_text = err.response.text if hasattr(err.response, 'text') else str(err)
+        logger.error(f"HTTP error occurred: {err} - {error_text[:500]}") # Log first 500 chars of error
+        return f"Error: API request failed (Status {err.response.status_code})."
+    if isinstance(err, requests.exceptions.RequestException):
+        logger.error(f"Request exception occurred: {err}")
+        return f"Error: Could not connect to the API. ({err})"
+    logger.exception(f"An unexpected error occurred while calling Gemini: {err}")
+    return f"Error: An unexpected error occurred. ({err})"
+
+def generate_text(api_key: str, model_name: str, prompt: str, history: Iterable[dict] | None = None,
+                  cache: ResponseCache | None = None) -> str:
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model_name, history, prompt)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            logger.debug("Serving Gemini response from local cache.")
+            return cached_text
+
+    url = _endpoint_url(model_name, "generateContent")
+    data = _build_payload(prompt, history)
+
     try:
         logger.debug(f"Sending request to Gemini API. URL: {url}")
         # logger.debug(f"Payload: {json.dumps(data)}") # Can be very verbose
-        response = requests.post(url, headers=headers, json=data, timeout=90)
+        response = _post_with_retry(url, _headers(api_key), data)
         response.raise_for_status()
 
-        response_data = response.json()
+        response_data = _json_loads(response.content)
         logger.debug(f"Gemini API Response received.") # Avoid logging full response if too large
 
-        candidates = response_data.get('candidates')
-        if candidates and candidates[0].get('content', {}).get('parts'):
-            text_parts = candidates[0]['content']['parts']
+        # Index straight into the happy path; fall back to the diagnostics below only when it is missing.
+        try:
+            text_parts = response_data['candidates'][0]['content']['parts']
+        except (KeyError, IndexError, TypeError):
+            text_parts = None
+
+        if text_parts:
             full_text = "".join(part.get('text', '') for part in text_parts).strip()
 
             if full_text:
-                # Simple check for API refusal/inability to answer
-                refusal_phrases = ["i cannot fulfill this request", "i'm unable to create content of that nature", "i am unable to provide assistance"]
-                if any(phrase in full_text.lower() for phrase in refusal_phrases):
-                    logger.warning(f"Gemini API indicated refusal: {full_text[:100]}...")
-                    # Return the refusal as is, so user sees it.
+                _log_refusal(full_text)
+                if cache_key:
+                    cache.set(cache_key, full_text)
                 return full_text
             else:
                 logger.warning("Received empty text part(s) from Gemini API.")
@@ -55,13 +148,103 @@ def generate_text(api_key: str, model_name: str, prompt: str, history: list = No
             logger.error(f"Invalid response structure from Gemini API: {response_data}")
             return "Error: Could not parse the response from the model."
 
-    except requests.exceptions.HTTPError as http_err:
-        error_text = http_err.response.text if hasattr(http_err.response, 'text') else str(http_err)
-        logger.error(f"HTTP error occurred: {http_err} - {error_text[:500]}") # Log first 500 chars of error
-        return f"Error: API request failed (Status {http_err.response.status_code})."
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"Request exception occurred: {req_err}")
-        return f"Error: Could not connect to the API. ({req_err})"
     except Exception as e:
-        logger.exception(f"An unexpected error occurred in generate_text: {e}")
-        return f"Error: An unexpected error occurred. ({e})"
+        return _request_error_message(e)
+
+def stream_text(api_key: str, model_name: str, prompt: str, history: Iterable[dict] | None = None,
+                cache: ResponseCache | None = None):
+    """
+    Yields the model's reply in chunks as it is generated, using the server-sent events endpoint.
+    On failure a single chunk starting with "Error:" is yielded, as generate_text would return.
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model_name, history, prompt)
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            logger.debug("Serving Gemini response from local cache.")
+            yield cached_text
+            return
+
+    url = _endpoint_url(model_name, "streamGenerateContent")
+    text_parts = []
+
+    try:
+        logger.debug(f"Sending streaming request to Gemini API. URL: {url}")
+        with _post_with_retry(url, _headers(api_key), _build_payload(prompt, history), stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue # Skip SSE keep-alives and blank separators
+                event = _json_loads(line[5:])
+                try:
+                    event_parts = event['candidates'][0]['content']['parts']
+                except (KeyError, IndexError, TypeError):
+                    reason = event.get('promptFeedback', {}).get('blockReason')
+                    if reason:
+                        logger.warning(f"Gemini API request blocked. Reason: {reason}")
+                        yield f"Error: Your request was blocked by the API. Reason: {reason}"
+                        return
+                    continue # e.g. a final event carrying only finishReason/usage metadata
+                chunk = "".join(part.get('text', '') for part in event_parts)
+                if chunk:
+                    text_parts.append(chunk)
+                    yield chunk
+    except Exception as e:
+        yield _request_error_message(e)
+        return
+
+    full_text = "".join(text_parts).strip()
+    if not full_text:
+        logger.warning("Received empty text part(s) from Gemini API.")
+        yield "Error: Received an empty response from the model."
+        return
+    _log_refusal(full_text)
+    if cache_key:
+        cache.set(cache_key, full_text)
+
+def generate_batch(api_key: str, model_name: str, prompts: list[str], max_workers: int = 4,
+                   cache: ResponseCache | None = None) -> list[str]:
+    """
+    Sends independent prompts (no shared history) concurrently and returns the replies in prompt order.
+    Each reply follows generate_text's convention, so failures come back as "Error: ..." strings.
+    """
+    max_workers = max(1, max_workers) # ThreadPoolExecutor rejects 0
+    if max_workers > _POOL_MAXSIZE:
+        logger.warning(f"max_workers={max_workers} exceeds the connection pool size ({_POOL_MAXSIZE}); extra connections will not be reused.")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda prompt: generate_text(api_key, model_name, prompt, cache=cache),
+            prompts
+        ))
+
+# Each answer in a combined reply starts with a heading line of its own, e.g. "### Answer 2".
+# Answers may contain numbered lists or markdown of their own, so the heading must be unambiguous.
+_ANSWER_HEADING = "### Answer {index}"
+_ANSWER_HEADING_RE = re.compile(r'^[ \t]*###[ \t]*Answer[ \t]+(\d+)[ \t]*:?[ \t]*$', re.MULTILINE | re.IGNORECASE)
+
+def generate_combined(api_key: str, model_name: str, prompts: list[str], max_workers: int = 4,
+                      cache: ResponseCache | None = None) -> list[str]:
+    """
+    Sends all prompts as one numbered question list in a single request and splits the answers back out
+    at their "### Answer N" headings. Falls back to generate_batch (one request per prompt) if the reply
+    fails or its headings do not match the prompts.
+    """
+    combined_prompt = "".join((
+        "Answer each of the following numbered questions concisely. Start each answer with a line containing only "
+        f"'{_ANSWER_HEADING.format(index='N')}', where N is the question number, and answer the questions in order. "
+        "Do not use that heading anywhere else.\n\n",
+        "\n".join(f"{index}. {prompt}" for index, prompt in enumerate(prompts, start=1)),
+    ))
+    reply = generate_text(api_key, model_name, combined_prompt)
+    if not reply.startswith("Error:"):
+        pieces = _ANSWER_HEADING_RE.split(reply)
+        # split() yields [preamble, number, answer, number, answer, ...]
+        numbers = [int(number) for number in pieces[1::2]]
+        answers = [answer.strip() for answer in pieces[2::2]]
+        if numbers == list(range(1, len(prompts) + 1)) and all(answers):
+            return answers
+        logger.warning(f"Combined reply had {len(numbers)} answer headings for {len(prompts)} prompts. Falling back to separate requests.")
+    else:
+        logger.warning(f"Combined request failed ({reply}). Falling back to separate requests.")
+    return generate_batch(api_key, model_name, prompts, max_workers=max_workers, cache=cache)
@@ -0,0 +1,80 @@
+# response_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+_KEY_VERSION = 2
+
+class ResponseCache:
+    """Persistent LRU cache of model responses with a TTL, stored as a single JSON file."""
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = os.path.expanduser(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> [stored_at, text], least recently used first
+        self._lock = threading.Lock() # Batch requests read and write the cache from worker threads
+        self._load()
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """
+        Drops only surrounding whitespace and trailing punctuation ("foo?" vs "foo").
+        Case and inner whitespace are kept: they can change the meaning (identifiers, pasted code).
+        """
+        return prompt.strip().rstrip('?!. ')
+
+    @classmethod
+    def make_key(cls, model_name: str, history: Iterable[dict] | None, prompt: str) -> str:
+        # "v" changes whenever the key derivation does, so entries stored under an older scheme are never served.
+        payload = json.dumps({"v": _KEY_VERSION, "model": model_name, "history": list(history or []),
+                              "prompt": cls.normalize_prompt(prompt)},
+                             sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, text = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def set(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = [time.time(), text]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = OrderedDict(json.load(f))
+            logger.debug(f"Loaded {len(self._entries)} cached responses from {self.path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable response cache '{self.path}': {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path) # Atomic, so a crash never leaves a truncated cache
+        except OSError as e:
+            logger.warning(f"Could not write response cache '{self.path}': {e}")
@@ -1,27 +1,72 @@
 # tts_player.py
+import atexit
 import subprocess
-import shlex
+import shutil
 import os
 import logging
-import re
+import signal
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
-class TTSEngine(ABC):
-    def clean_text(self, text: str) -> str:
-        """Basic text cleaning for TTS."""
-        # Original problematic line (for reference, now commented out):
-        # cleaned = re.sub(r'[*_`#~"'!${}()<>|;&]', '', text)
+# Characters to remove before speaking: *, _, `, #, ~, ", ', !, $, {, }, (, ), <, >, |, ;, &
+_UNWANTED_BYTES = b'*_`#~"\'!${}()<>|;&'
+
+# espeak-ng reads stdin a line at a time into a fixed ~1000-byte buffer; longer lines
+# are spoken in fragments cut mid-word. Stay well under it.
+_ESPEAK_MAX_LINE_BYTES = 900
+
+def _split_lines(data: bytes, limit: int) -> list[bytes]:
+    """
+    Splits cleaned single-line text into lines of at most limit bytes, preferring sentence
+    ends, then spaces. A single word longer than limit is cut, but never inside a UTF-8 character.
+    """
+    lines = []
+    while len(data) > limit:
+        head = data[:limit + 1] # One extra byte so a boundary right at the limit is found
+        cut = max(head.rfind(b'. '), head.rfind(b'! '), head.rfind(b'? ')) + 1 # Keep the punctuation
+        if cut <= limit // 2: # No sentence end, or one so early it would leave a tiny line
+            cut = head.rfind(b' ')
+        if cut <= 0:
+            cut = limit
+            while cut > 1 and data[cut] & 0xC0 == 0x80: # Back off continuation bytes
+                cut -= 1
+        lines.append(data[:cut].rstrip())
+        data = data[cut:].lstrip()
+    if data:
+        lines.append(data)
+    return lines
 
-        # Corrected regex:
-        # Explicitly escapes characters that might be part of the parsing confusion,
-        # even if not strictly necessary inside a character class [] for all of them.
-        # Characters to remove: *, _, `, #, ~, ", ', !, $, {, }, (, ), <, >, |, ;, &
-        cleaned = re.sub(r'[*_`#~"\'!\$\{\}\(\)\<\>\|;&]', '', text)
+class _StderrTail:
+    """
+    Drains a child's stderr on a daemon thread, so a chatty child never blocks on a full pipe.
+    Lines are logged at debug level and the last few are kept to explain an unexpected exit.
+    """
+    def __init__(self, process: subprocess.Popen, name: str):
+        self.lines = deque(maxlen=5)
+        self._thread = threading.Thread(target=self._read, args=(process.stderr, name),
+                                        name=f"{name}-stderr", daemon=True)
+        self._thread.start()
 
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip() # Consolidate whitespace
-        return cleaned
+    def _read(self, stream, name: str):
+        for raw_line in stream:
+            line = raw_line.decode('utf-8', 'replace').rstrip()
+            if line:
+                self.lines.append(line)
+                logger.debug(f"{name}: {line}")
+
+    def summary(self) -> str:
+        self._thread.join(timeout=1) # The child has exited, so the reader reaches EOF promptly
+        return " | ".join(self.lines) or "no stderr output"
+
+class TTSEngine(ABC):
+    def clean_bytes(self, text: str) -> bytes:
+        """Basic text cleaning for TTS: encodes once, then strips unwanted characters and collapses whitespace."""
+        # All unwanted characters are ASCII, and UTF-8 never reuses ASCII byte values inside
+        # multi-byte sequences, so deleting them from the encoded buffer is safe.
+        return b' '.join(text.encode('utf-8', 'replace').translate(None, _UNWANTED_BYTES).split())
 
     @abstractmethod
     def speak(self, text: str):
@@ -31,21 +76,43 @@ class TTSEngine(ABC):
     def is_available(self) -> bool:
         pass
 
+    def close(self):
+        """Release any long-lived resources held by the engine."""
+        pass
+
+    def stop(self):
+        """Cut off speech immediately, dropping anything still queued. Defaults to close()."""
+        self.close()
+
 class PiperTTS(TTSEngine):
-    def __init__(self, executable_path: str, model_path: str | None): # model_path can be None initially
+    def __init__(self, executable_path: str, model_path: str | None, # model_path can be None initially
+                 latency_msec: int = 0):
         self.executable_path = executable_path
         self.model_path = model_path
-        self.paplay_available = False
-        try:
-            # Check for paplay
-            subprocess.run(['which', 'paplay'], capture_output=True, check=True, text=True)
-            self.paplay_available = True
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        self.latency_msec = latency_msec
+        self._piper = None
+        self._player = None
+        self._piper_stderr = None
+        self._player_stderr = None
+        # speak() runs on the TTS worker while stop() comes from the main thread; the lock keeps
+        # them from swapping the process handles out from under each other.
+        self._lock = threading.RLock()
+        atexit.register(self.close) # Don't leave piper/paplay running if the app exits without close()
+        self._available = None # Result of _check_available, computed on first use
+        # Check for paplay
+        self.paplay_available = shutil.which('paplay') is not None
+        if not self.paplay_available:
             logger.warning("`paplay` command not found. Piper TTS might not produce audio even if piper-tts and model are present.")
 
     def is_available(self) -> bool:
+        # speak() asks on every utterance; the executables and model don't move mid-session.
+        if self._available is None:
+            self._available = self._check_available()
+        return self._available
+
+    def _check_available(self) -> bool:
         # Check executable
-        if not (os.path.exists(self.executable_path) or subprocess.run(['which', self.executable_path], capture_output=True).returncode == 0):
+        if not (os.path.exists(self.executable_path) or shutil.which(self.executable_path)):
             logger.warning(f"Piper executable not found at '{self.executable_path}' or in PATH.")
             return False
         # Check model path (now explicitly required if Piper is chosen)
@@ -57,74 +124,182 @@ class PiperTTS(TTSEngine):
              return False
         return True
 
+    def _get_processes(self) -> tuple[subprocess.Popen, subprocess.Popen]:
+        # With --output-raw, piper loads the voice model once and synthesizes each stdin line
+        # as it arrives. Its stdout feeds a single paplay, so neither the model load nor the
+        # player startup is paid per utterance.
+        if self._piper is not None and (self._piper.poll() is not None or self._player.poll() is not None):
+            logger.warning(f"Piper or paplay process exited ({self._exit_details()}); restarting both.")
+            self.close()
+        if self._piper is None:
+            piper_command = [self.executable_path, '--model', self.model_path, '--output-raw']
+            logger.debug(f"Starting Piper process: {' '.join(piper_command)}")
+            piper = subprocess.Popen(piper_command, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            player_command = ['paplay', '--raw', '--rate=22050', '--format=s16le', '--channels=1']
+            if self.latency_msec > 0:
+                player_command.append(f'--latency-msec={self.latency_msec}')
+            try:
+                player = subprocess.Popen(player_command, stdin=piper.stdout,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            except OSError:
+                piper.kill()
+                piper.wait()
+                raise
+            piper.stdout.close() # paplay holds the read end now; drop ours so EOF propagates on close
+            self._piper_stderr = _StderrTail(piper, "piper")
+            self._player_stderr = _StderrTail(player, "paplay")
+            # Published only once both have started; stop() reads them without the lock.
+            self._piper, self._player = piper, player
+        return self._piper, self._player
+
+    def _exit_details(self) -> str:
+        return (f"piper code {self._piper.poll()}: {self._piper_stderr.summary()}; "
+                f"paplay code {self._player.poll()}: {self._player_stderr.summary()}")
+
     def speak(self, text: str):
         if not self.is_available(): # This check now includes model_path existence
             logger.error("Piper TTS is not available or configured correctly (executable, model, or paplay missing).")
             return
 
-        cleaned_text = self.clean_text(text)
-        if not cleaned_text:
+        cleaned_bytes = self.clean_bytes(text)
+        if not cleaned_bytes:
             logger.info("No text to speak after cleaning for Piper.")
             return
 
-        # Ensure self.model_path is a string before passing to shlex.quote if it could still be None here
-        # (though is_available should guard this)
-        if not self.model_path: # Defensive check
-            logger.error("Piper model path is None during speak call, cannot proceed.")
-            return
+        with self._lock:
+            try:
+                piper, _ = self._get_processes()
+            except OSError as e:
+                logger.error(f"Could not start Piper/paplay: {e}")
+                return
+
+            try:
+                # clean_bytes collapses newlines, so each utterance is exactly one line.
+                piper.stdin.write(cleaned_bytes + b"\n")
+                piper.stdin.flush()
+            except OSError as e:
+                piper.wait() # A broken pipe means piper is exiting; its stderr says why
+                if piper.returncode == -signal.SIGTERM:
+                    logger.debug("Piper was stopped while an utterance was being written.")
+                else:
+                    logger.error(f"Error writing to Piper process: {e} ({self._exit_details()})")
+                self.close()
+            except Exception as e:
+                logger.exception(f"An unexpected error occurred with Piper TTS: {e}")
 
-        command_str = (
-            f"echo {shlex.quote(cleaned_text)} | "
-            f"{shlex.quote(self.executable_path)} --model {shlex.quote(self.model_path)} --output_file - | "
-            f"paplay --raw --rate=22050 --format=s16le --channels=1"
-        )
-        try:
-            logger.debug(f"Executing Piper command: {command_str}")
-            process = subprocess.run(command_str, shell=True, check=True,
-                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True) # Capture stderr as text
-            if process.stderr and ("error" in process.stderr.lower() or "fail" in process.stderr.lower()):
-                 logger.warning(f"Piper stderr: {process.stderr.strip()}")
-        except subprocess.CalledProcessError as e:
-            stderr_output = e.stderr if e.stderr else "N/A"
-            logger.error(f"Error during Piper TTS execution: {e}. Stderr: {stderr_output}")
-        except Exception as e:
-            logger.exception(f"An unexpected error occurred with Piper TTS: {e}")
+    def close(self):
+        with self._lock:
+            if self._piper is None:
+                return
+            try:
+                self._piper.stdin.close() # Piper finishes the queued lines, then exits and closes paplay's input
+            except OSError:
+                pass # Piper already exited, so there is nothing left to flush
+            self._piper.wait()
+            self._player.wait()
+            self._piper, self._player = None, None
+
+    def stop(self):
+        # Terminate before taking the lock: speak() may hold it while blocked writing to a
+        # full pipe, and killing piper is what unblocks that write.
+        # The handles can still be cleared between the two reads, hence the None checks.
+        processes = [process for process in (self._piper, self._player) if process is not None]
+        if not processes:
+            return
+        for process in processes:
+            process.terminate()
+        with self._lock:
+            for process in processes:
+                process.wait()
+            if self._piper in processes or self._player in processes: # speak() may already have cleaned up
+                self._piper, self._player = None, None
 
 class ESpeakTTS(TTSEngine):
     def __init__(self, voice: str, speed: int, pitch: int):
         self.voice = voice
         self.speed = str(speed)
         self.pitch = str(pitch)
+        self._process = None
+        self._stderr = None
+        self._available = None
+        self._lock = threading.RLock() # Guards _process between the TTS worker and stop()
+        atexit.register(self.close) # Don't leave espeak-ng running if the app exits without close()
 
     def is_available(self) -> bool:
-        try:
-            subprocess.run(['which', 'espeak-ng'], capture_output=True, check=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            logger.warning("'espeak-ng' command not found. eSpeak TTS will not be available.")
-            return False
+        # Looked up once; speak() asks on every utterance.
+        if self._available is None:
+            self._available = shutil.which('espeak-ng') is not None
+            if not self._available:
+                logger.warning("'espeak-ng' command not found. eSpeak TTS will not be available.")
+        return self._available
+
+    def _get_process(self) -> subprocess.Popen:
+        # Without a text argument espeak-ng speaks stdin line by line, so a single
+        # process serves the whole session instead of a fork+exec per utterance.
+        if self._process is not None and self._process.poll() is not None:
+            logger.warning(f"eSpeak process exited (code {self._process.returncode}: {self._stderr.summary()}); restarting it.")
+            self._process = None
+        if self._process is None:
+            command = ['espeak-ng', '-v', self.voice, '-s', self.speed, '-p', self.pitch]
+            logger.debug(f"Starting eSpeak process: {' '.join(command)}")
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self._stderr = _StderrTail(self._process, "espeak-ng")
+        return self._process
 
     def speak(self, text: str):
         if not self.is_available():
             logger.error("eSpeak-NG is not available.")
             return
 
-        cleaned_text = self.clean_text(text)
-        if not cleaned_text:
+        cleaned_bytes = self.clean_bytes(text)
+        if not cleaned_bytes:
             logger.info("No text to speak after cleaning for eSpeak.")
             return
 
-        command = ['espeak-ng', '-v', self.voice, '-s', self.speed, '-p', self.pitch, cleaned_text]
-        try:
-            logger.debug(f"Executing eSpeak command: {' '.join(command)}")
-            process = subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True) # Capture stderr as text
-            if process.stderr and ("error" in process.stderr.lower() or "fail" in process.stderr.lower()):
-                 logger.warning(f"eSpeak-ng stderr: {process.stderr.strip()}")
-        except subprocess.CalledProcessError as e:
-            stderr_output = e.stderr if e.stderr else "N/A"
-            logger.error(f"Error during eSpeak-NG execution: {e}. Stderr: {stderr_output}")
-        except Exception as e:
-            logger.exception(f"An unexpected error occurred with eSpeak-NG: {e}")
+        with self._lock:
+            try:
+                process = self._get_process()
+            except OSError as e:
+                logger.error(f"Could not start eSpeak-NG: {e}")
+                return
+
+            try:
+                # clean_bytes collapses newlines; long replies are re-split into lines espeak-ng reads whole.
+                process.stdin.write(b"".join(line + b"\n" for line in _split_lines(cleaned_bytes, _ESPEAK_MAX_LINE_BYTES)))
+                process.stdin.flush()
+            except OSError as e:
+                process.wait() # A broken pipe means espeak-ng is exiting; its stderr says why
+                if process.returncode == -signal.SIGTERM:
+                    logger.debug("eSpeak-NG was stopped while an utterance was being written.")
+                else:
+                    logger.error(f"Error writing to eSpeak-NG process: {e} (code {process.returncode}: {self._stderr.summary()})")
+                self._process = None
+            except Exception as e:
+                logger.exception(f"An unexpected error occurred with eSpeak-NG: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass # espeak-ng already exited, so there is nothing left to flush
+            self._process.wait()
+            self._process = None
+
+    def stop(self):
+        # Terminate outside the lock so a speak() blocked on a full pipe gets a broken pipe and lets go.
+        process = self._process
+        if process is None:
+            return
+        process.terminate()
+        with self._lock:
+            process.wait()
+            if self._process is process:
+                self._process = None
 
 def get_tts_engine(engine_name: str, config_module) -> TTSEngine | None:
     engine_name = engine_name.lower()
@@ -134,7 +309,8 @@ def get_tts_engine(engine_name: str, config_module) -> TTSEngine | None:
             logger.error("Piper TTS selected, but PIPER_VOICE_MODEL_PATH is not configured. Piper is unavailable.")
             return None
         return PiperTTS(executable_path=config_module.PIPER_EXECUTABLE_PATH,
-                        model_path=config_module.PIPER_VOICE_MODEL_PATH)
+                        model_path=config_module.PIPER_VOICE_MODEL_PATH,
+                        latency_msec=config_module.PAPLAY_LATENCY_MSEC)
     elif engine_name == "espeak":
         return ESpeakTTS(voice=config_module.ESPEAK_VOICE,
                          speed=config_module.ESPEAK_SPEED,
@@ -1,10 +1,15 @@
-import glob
 import os
 
 def find_latest_report_file(pattern_prefix, extension=".txt", search_path="."):
-    glob_pattern = os.path.join(search_path, f"{pattern_prefix}*{extension}")
-    list_of_files = glob.glob(glob_pattern)
-    latest_file = max(list_of_files, key=os.path.getctime)
+    # scandir gives the file type from the directory listing, so only matching
+    # reports are stat()ed, and there is no glob/fnmatch pass over every entry.
+    with os.scandir(search_path) as entries:
+        matching_files = [
+            entry for entry in entries
+            if entry.name.startswith(pattern_prefix) and entry.name.endswith(extension)
+            and entry.is_file()
+        ]
+    latest_file = max(matching_files, key=lambda entry: entry.stat().st_ctime).path
     print(f"Found latest report: {latest_file}")
     return latest_file
 
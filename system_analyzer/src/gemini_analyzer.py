@@ -1,18 +1,7 @@
-import google.generativeai as genai
 from . import config
 
-def _build_prompt(md_content, txt_content):
-    combined_reports = f"""
-Markdown Report:
----
-{md_content or "Markdown report not available."}
----
-Detailed Text Report:
----
-{txt_content or "Detailed text report not available."}
----
-"""
-    prompt = f"""
+# Static instructions, built once at import; only the report sections vary per call.
+_PROMPT_HEADER = """
 You are an expert system analyst. Analyze the following Arch Linux system information.
 Provide a comprehensive analysis as a single, well-formed HTML document.
 
@@ -29,30 +18,46 @@ The HTML analysis should:
 10. HTML Structure: Use <h1>, <h2>, <p>, <ul>/<ol>, <table>, <code>, <pre>.
 11. Output: ONLY the HTML document (<!DOCTYPE html> to </html>).
 12. Styling (Solarized Dark Theme - embed CSS in <style> in <head>):
-    body {{ background-color: #002b36; color: #839496; font-family: sans-serif; margin: 20px; line-height: 1.6; }}
-    h1, h2, h3 {{ color: #268bd2; border-bottom: 1px solid #586e75; padding-bottom: 0.3em; margin-top: 1.5em; }}
-    h1 {{ font-size: 2em; }} h2 {{ font-size: 1.5em; }}
-    table {{ border-collapse: collapse; width: 95%; margin: 1em auto; box-shadow: 0 2px 3px rgba(0,0,0,0.1); }}
-    th, td {{ border: 1px solid #586e75; padding: 10px 12px; text-align: left; }}
-    th {{ background-color: #073642; color: #93a1a1; font-weight: bold; }}
-    tr:nth-child(even) {{ background-color: #073642; }}
-    pre, code {{ background-color: #073642; color: #b58900; padding: 0.2em 0.4em; border-radius: 4px; font-family: 'Courier New', Courier, monospace; }}
-    pre {{ padding: 1em; overflow-x: auto; display: block; white-space: pre-wrap; word-wrap: break-word; border: 1px solid #586e75; }}
-    p code {{ display: inline; padding: 0.1em 0.3em; }}
-    ul, ol {{ margin-left: 25px; padding-left: 0; }} li {{ margin-bottom: 0.5em; }}
-    a {{ color: #b58900; text-decoration: none; }} a:hover {{ color: #cb4b16; text-decoration: underline; }}
-    .overview-box {{ background-color: #073642; border: 1px solid #586e75; padding: 15px; margin-bottom: 20px; border-radius: 5px; }}
-    .recommendations {{ border-left: 3px solid #859900; padding-left: 15px; background-color: #073642; }}
-    .issues {{ border-left: 3px solid #dc322f; padding-left: 15px; background-color: #073642; }}
+    body { background-color: #002b36; color: #839496; font-family: sans-serif; margin: 20px; line-height: 1.6; }
+    h1, h2, h3 { color: #268bd2; border-bottom: 1px solid #586e75; padding-bottom: 0.3em; margin-top: 1.5em; }
+    h1 { font-size: 2em; } h2 { font-size: 1.5em; }
+    table { border-collapse: collapse; width: 95%; margin: 1em auto; box-shadow: 0 2px 3px rgba(0,0,0,0.1); }
+    th, td { border: 1px solid #586e75; padding: 10px 12px; text-align: left; }
+    th { background-color: #073642; color: #93a1a1; font-weight: bold; }
+    tr:nth-child(even) { background-color: #073642; }
+    pre, code { background-color: #073642; color: #b58900; padding: 0.2em 0.4em; border-radius: 4px; font-family: 'Courier New', Courier, monospace; }
+    pre { padding: 1em; overflow-x: auto; display: block; white-space: pre-wrap; word-wrap: break-word; border: 1px solid #586e75; }
+    p code { display: inline; padding: 0.1em 0.3em; }
+    ul, ol { margin-left: 25px; padding-left: 0; } li { margin-bottom: 0.5em; }
+    a { color: #b58900; text-decoration: none; } a:hover { color: #cb4b16; text-decoration: underline; }
+    .overview-box { background-color: #073642; border: 1px solid #586e75; padding: 15px; margin-bottom: 20px; border-radius: 5px; }
+    .recommendations { border-left: 3px solid #859900; padding-left: 15px; background-color: #073642; }
+    .issues { border-left: 3px solid #dc322f; padding-left: 15px; background-color: #073642; }
 
 System Information:
-{combined_reports}
+"""
+
+_PROMPT_FOOTER = """
 
 Generate the HTML analysis now.
 """
-    return prompt
+
+def _build_prompt(md_content, txt_content):
+    return "".join((
+        _PROMPT_HEADER,
+        "\nMarkdown Report:\n---\n",
+        md_content or "Markdown report not available.",
+        "\n---\nDetailed Text Report:\n---\n",
+        txt_content or "Detailed text report not available.",
+        "\n---\n",
+        _PROMPT_FOOTER,
+    ))
 
 def ask_gemini_for_analysis(md_report_content, txt_report_content):
+    # Imported here: the SDK (grpc, protobuf, google.auth) is slow to load and is
+    # only needed once the system report has been generated and read.
+    import google.generativeai as genai
+
     print(f"Initializing Gemini model: {config.GEMINI_MODEL_NAME}...")
     genai.configure(api_key=config.GEMINI_API_KEY)
     model = genai.GenerativeModel(config.GEMINI_MODEL_NAME)